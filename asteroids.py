@@ -6,6 +6,7 @@ A simple Asteroids-type game, made using pygame. """
 
 import sys
 import math
+import time
 import random
 import os.path
 import pygame
@@ -15,6 +16,15 @@ from pgu import gui
 # TODO: Add command-line debug option(s)?.
 DEBUG = False
 
+# If set, key events that arrive while a frame is being set up are picked up
+# immediately before the game state is updated, rather than on the next frame,
+# and frames are paced with a busy loop, which is more precise than sleeping.
+LOW_LATENCY = False
+
+# Minimum number of updates between shots. Holding down the fire key fires at
+# this rate.
+FIRE_INTERVAL = 9
+
 # Some useful color constants.
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
@@ -460,6 +470,142 @@ class GameOverScreen(gui.Table):
         # Ensure that the input box is focused for next time.
         self.input.focus()
 
+class LatencyStats:
+    """ Accumulates latency samples (in seconds). Pygame events carry no
+    timestamps, so each sample is a range bounded by the latest and earliest
+    times at which the input could have arrived. """
+
+    def __init__(self, name):
+        """ Constructor. """
+
+        self.name = name
+        self.count = 0
+        self.total_low = self.total_high = 0.0
+        self.worst = 0.0
+
+    def add(self, low, high):
+        """ Record a latency sample lying between low and high. """
+
+        self.count += 1
+        self.total_low += low
+        self.total_high += high
+        self.worst = max(self.worst, high)
+
+    def summary(self):
+        """ Return a one-line summary of the samples recorded so far. """
+
+        if self.count == 0:
+            return '{0}: no samples'.format(self.name)
+
+        low = 1000 * self.total_low / self.count
+        high = 1000 * self.total_high / self.count
+        return ('{0}: avg {1:.2f} ms (between {2:.2f} and {3:.2f} ms), '
+                'max {4:.2f} ms over {5} samples').format(
+            self.name, (low + high) / 2, low, high, 1000 * self.worst,
+            self.count)
+
+class Controls:
+    """ Snapshot of the player controls, taken once per tick. """
+
+    # Keys used to control the ship.
+    keys = (K_LEFT, K_RIGHT, K_UP, K_LCTRL, K_RCTRL)
+
+    def __init__(self):
+        """ Constructor. """
+
+        # Pygame events carry no timestamps, so the times at which the event
+        # queue is emptied are used to bound when the events arrived. Events in
+        # a batch arrived after the previous batch was taken (since), and
+        # before the batch itself was taken (until).
+        self.emptied = time.perf_counter()
+        self.since = self.until = self.emptied
+
+        self.clear()
+
+    def clear(self):
+        """ Reset the controls, discarding any pending input. """
+
+        self.left = self.right = self.thrust = self.fire = False
+
+        # Is a shot due on this tick? Was the fire key pressed on this tick?
+        self.shoot = False
+        self.tapped = False
+
+        # A fire key press that has not yet resulted in a shot.
+        self.pending = False
+
+        # Number of updates until the next shot is allowed.
+        self.cooldown = 0
+
+        # Earliest and latest possible arrival times of the game key events in
+        # the snapshot, if there were any.
+        self.stamp = None
+
+    def drain(self):
+        """ Empty the event queue and return the events. """
+
+        self.since = self.emptied
+        self.emptied = time.perf_counter()
+        events = pygame.event.get()
+        self.until = time.perf_counter()
+
+        return events
+
+    def poll(self, events):
+        """ Take a snapshot of the key state, combined with the game key
+        presses in a batch of events. Key presses are coalesced so that a key
+        tapped between two snapshots still registers, and repeated presses
+        count only once. """
+
+        if LOW_LATENCY:
+            # Pick up any key events that arrived since the queue was emptied.
+            # Keys not used by the game are put back for the next frame.
+            self.emptied = time.perf_counter()
+            late = pygame.event.get((KEYDOWN, KEYUP))
+            self.until = time.perf_counter()
+
+            for ev in late:
+                if ev.key not in self.keys:
+                    pygame.event.post(ev)
+
+            events = list(events) + late
+
+        pressed = set()
+        active = False
+        for ev in events:
+            if ev.type not in (KEYDOWN, KEYUP) or ev.key not in self.keys:
+                continue
+
+            if ev.type == KEYDOWN:
+                pressed.add(ev.key)
+            active = True
+
+        keys = pygame.key.get_pressed()
+
+        def down(*codes):
+            return any(keys[code] or code in pressed for code in codes)
+
+        self.left = down(K_LEFT)
+        self.right = down(K_RIGHT)
+        self.thrust = down(K_UP)
+        self.fire = down(K_LCTRL, K_RCTRL)
+
+        # Fire while the fire key is held, or on a press, but no faster than
+        # the rate cap allows. A press during the cooldown fires once it ends.
+        self.tapped = K_LCTRL in pressed or K_RCTRL in pressed
+        if self.tapped:
+            self.pending = True
+
+        if self.cooldown > 0:
+            self.cooldown -= 1
+
+        self.shoot = (self.fire or self.pending) and self.cooldown == 0
+        if self.shoot:
+            self.pending = False
+            self.cooldown = FIRE_INTERVAL
+
+        self.stamp = (self.since, self.until) if active else None
+
 class Game:
     """ Class to manage game functionality. """
 
@@ -483,6 +629,10 @@ class Game:
         self.bullets = pygame.sprite.RenderPlain()
         self.asteroids = pygame.sprite.RenderPlain()
 
+        # Current control state of the ship, so that only changes are applied.
+        self.turning = 0
+        self.accelerating = False
+
         # Set up player score.
         self.score = 0
 
@@ -537,26 +687,50 @@ class Game:
 
         self.bullets.remove(offscreen)
 
-    def event(self, ev):
-        """ Process an event. """
+    def handle_input(self, controls):
+        """ Apply a snapshot of the player controls. Return whether a key press
+        or release on this tick changed anything. """
+
+        # Nothing to control if the ship is dead.
+        if len(self.ships) == 0:
+            return False
+
+        changed = False
+
+        if controls.left and not controls.right:
+            turning = 1
+        elif controls.right and not controls.left:
+            turning = -1
+        else:
+            turning = 0
 
-        if ev.type == KEYDOWN:
-            if ev.key == K_LEFT:
+        if turning != self.turning:
+            if turning == 1:
                 self.ship.start_turning_left()
-            elif ev.key == K_RIGHT:
+            elif turning == -1:
                 self.ship.start_turning_right()
-            elif ev.key == K_UP:
-                self.ship.start_accelerating()
-            elif ev.key == K_LCTRL or ev.key == K_RCTRL:
-                # Fire a bullet if the ship is still alive.
-                if len(self.ships) > 0:
-                    self.bullets.add(self.ship.shoot())
-
-        elif ev.type == KEYUP:
-            if ev.key == K_LEFT or ev.key == K_RIGHT:
+            else:
                 self.ship.stop_turning()
-            elif ev.key == K_UP:
+            self.turning = turning
+            changed = True
+
+        if controls.thrust != self.accelerating:
+            if controls.thrust:
+                self.ship.start_accelerating()
+            else:
                 self.ship.stop_accelerating()
+            self.accelerating = controls.thrust
+            changed = True
+
+        if controls.shoot:
+            self.bullets.add(self.ship.shoot())
+
+            # Shots from holding the fire key, or from a press made during the
+            # cooldown, don't respond to input on this tick.
+            if controls.tapped:
+                changed = True
+
+        return changed
 
     def update(self):
         """ Update the game state. """
@@ -637,30 +811,61 @@ def main():
     game_over_screen = GameOverScreen(game)
     gui_app.init(game_over_screen)
 
-    while True:
-        clock.tick(60)
-
-        # Process the event queue.
-        for ev in pygame.event.get():
-            if ev.type == QUIT:
-                return
-            elif ev.type == KEYDOWN and ev.key == K_ESCAPE:
-                return
-            elif ev.type == KEYDOWN and ev.key == K_F1:
-                game.start_new()
-            elif game.is_over():
-                gui_app.event(ev)
-            else:
-                game.event(ev)
-
-        game.update()
-        game.draw()
-
-        if game.is_over():
-            gui_app.paint()
+    # Set up input handling and latency measurement.
+    controls = Controls()
+    sim_latency = LatencyStats('Input to simulation')
+    flip_latency = LatencyStats('Input to flip')
 
-        # Display the changes to the screen.
-        pygame.display.flip()
+    try:
+        while True:
+            if LOW_LATENCY:
+                clock.tick_busy_loop(60)
+            else:
+                clock.tick(60)
+
+            # Process the event queue.
+            events = controls.drain()
+            for ev in events:
+                if ev.type == QUIT:
+                    return
+                elif ev.type == KEYDOWN and ev.key == K_ESCAPE:
+                    return
+                elif ev.type == KEYDOWN and ev.key == K_F1:
+                    game.start_new()
+                    controls.clear()
+                elif game.is_over():
+                    gui_app.event(ev)
+
+            # Game input is handled as a single batch per tick, from a
+            # snapshot of the key state. Latency is only measured for input
+            # that changed the game.
+            stamp = None
+            if game.is_over():
+                controls.clear()
+            else:
+                controls.poll(events)
+                if game.handle_input(controls):
+                    stamp = controls.stamp
+
+            game.update()
+            if stamp is not None:
+                now = time.perf_counter()
+                sim_latency.add(now - stamp[1], now - stamp[0])
+
+            game.draw()
+
+            if game.is_over():
+                gui_app.paint()
+
+            # Display the changes to the screen.
+            pygame.display.flip()
+            if stamp is not None:
+                now = time.perf_counter()
+                flip_latency.add(now - stamp[1], now - stamp[0])
+    finally:
+        if DEBUG:
+            print(sim_latency.summary())
+            print(flip_latency.summary())
 
 if __name__ == '__main__':
     main()